@@ -316,14 +316,17 @@ app.clientside_callback(
      Output('analysis-error-output', 'children')],
     Input('upload-vcf', 'contents'),
     State('upload-vcf', 'filename'),
+    State('store-vcf-raw-data', 'data'),
     prevent_initial_call=True
 )
-def update_vcf_store_and_clear_results(contents, filename):
+def update_vcf_store_and_clear_results(contents, filename, previous_store):
     if contents is not None:
+        if previous_store and previous_store.get('vcf_temp_path'):
+            cleanup_temp_vcf(previous_store['vcf_temp_path'])
         data_summary, message = parse_vcf_to_json_summary(contents, filename)
         if data_summary:
             return (
-                {'filename': data_summary['filename'], 'vcf_contents_base64': data_summary['vcf_contents_base64']},
+                {'filename': data_summary['filename'], 'vcf_temp_path': data_summary['vcf_temp_path']},
                 html.Div(
                     f"✓ Berkas '{data_summary['filename']}' siap dianalisis. ({message})",
                     style={'fontSize': '14px', 'color': '#27ae60'}
@@ -391,10 +394,10 @@ def update_pooled_store_and_clear_results(contents, filename):
 def run_analysis_pipeline_callback(n_clicks, vcf_raw_data,
                                    maf_thresh, snp_miss_thresh,
                                    ind_miss_thresh, n_pca_components):
-    if not vcf_raw_data or 'vcf_contents_base64' not in vcf_raw_data or 'filename' not in vcf_raw_data:
+    if not vcf_raw_data or 'vcf_temp_path' not in vcf_raw_data or 'filename' not in vcf_raw_data:
         return None, "Silakan unggah berkas VCF terlebih dahulu."
 
-    vcf_contents_base64 = vcf_raw_data['vcf_contents_base64']
+    vcf_temp_path = vcf_raw_data['vcf_temp_path']
     filename = vcf_raw_data['filename']
     
     error_messages = []
@@ -411,7 +414,7 @@ def run_analysis_pipeline_callback(n_clicks, vcf_raw_data,
         return None, " ".join(error_messages)
 
     try:
-        results = trigger_analysis_pipeline(vcf_contents_base64, filename,
+        results = trigger_analysis_pipeline(vcf_temp_path, filename,
                                             maf_thresh=float(maf_thresh),
                                             snp_miss_thresh=float(snp_miss_thresh),
                                             ind_miss_thresh=float(ind_miss_thresh),
@@ -466,17 +469,17 @@ def display_analysis_results(pca_results_json):
     if not pca_results_json:
         return None
 
-    pca_coords_df_json = pca_results_json.get('pca_coords_df_json')
+    pca_coords_payload = pca_results_json.get('pca_coords_payload')
     variance_explained = pca_results_json.get('variance_explained')
     analysis_summary = pca_results_json.get('analysis_summary')
 
     pca_plot_div = html.Div("Gagal memuat plot PCA.")
-    pca_df = None 
-    fig = None 
+    pca_df = None
+    fig = None
 
-    if pca_coords_df_json and variance_explained:
+    if pca_coords_payload and variance_explained:
         try:
-            pca_df = pd.read_json(io.StringIO(pca_coords_df_json), orient='split') 
+            pca_df = dataframe_from_store_payload(pca_coords_payload)
             
             has_pc1 = 'PC1' in pca_df.columns and len(variance_explained) >= 1
             has_pc2 = 'PC2' in pca_df.columns and len(variance_explained) >= 2
@@ -552,8 +555,13 @@ def display_analysis_results(pca_results_json):
         try:
             pc_cols = [col for col in pca_df.columns if col.startswith('PC')]
             if 'Sample' in pca_df.columns and pc_cols:
-                df_for_pca_file = pca_df[['Sample'] + pc_cols]
-                pca_data_string = df_for_pca_file.to_csv(sep=' ', index=False, header=True)
+                samples_col = pca_df['Sample'].to_numpy(dtype=object).reshape(-1, 1)
+                pc_matrix = pca_df[pc_cols].to_numpy(dtype=np.float32)
+                pca_buffer = io.StringIO()
+                pca_buffer.write(' '.join(['Sample'] + pc_cols) + '\n')
+                np.savetxt(pca_buffer, np.column_stack([samples_col, pc_matrix.astype(object)]),
+                           fmt=' '.join(['%s'] + ['%.6g'] * len(pc_cols)))
+                pca_data_string = pca_buffer.getvalue()
                 
                 download_pca_link_div = html.Div(
                     html.A(
@@ -635,7 +643,7 @@ def display_fst_results(fst_results):
         return None
     
     try:
-        fst_matrix_df = pd.read_json(io.StringIO(fst_results['fst_matrix']), orient='split')
+        fst_matrix_df = dataframe_from_split_json(fst_results['fst_matrix'])
         
         heatmap_fig = go.Figure(data=go.Heatmap(
             z=fst_matrix_df.values,
@@ -643,8 +651,7 @@ def display_fst_results(fst_results):
             y=fst_matrix_df.index,
             colorscale='RdBu_r',
             colorbar=dict(title="FST"),
-            text=np.round(fst_matrix_df.values, 3),
-            texttemplate="%{text}",
+            texttemplate="%{z:.3f}",
             textfont={"size": 10},
             hovertemplate="Pool 1: %{y}<br>Pool 2: %{x}<br>FST: %{z:.4f}<extra></extra>"
         ))
@@ -4,14 +4,33 @@ import io
 import base64
 import tempfile
 import os
+import gzip
+import glob
+import shutil
 import warnings
+import concurrent.futures
+import multiprocessing
+import atexit
 from cyvcf2 import VCF
 import traceback
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow
+    import pyarrow.csv as pacsv
+except ImportError:
+    pyarrow = None
+    pacsv = None
+
 try:
     from vcfFunctions import (
         read_vcf_for_analysis,
         apply_quality_control,
+        stream_vcf_qc,
         run_pca_analysis
     )
     from fst_calculations import (
@@ -21,43 +40,134 @@ except ImportError:
     from app.vcfFunctions import (
         read_vcf_for_analysis,
         apply_quality_control,
+        stream_vcf_qc,
         run_pca_analysis
     )
     from app.fst_calculations import (
         create_fst_matrix
     )
 
+_temp_vcf_registry = set()
+
+
+def _register_temp_vcf(path):
+    _temp_vcf_registry.add(path)
+
+
+def cleanup_temp_vcf(path):
+    if not path:
+        return
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+    # cache Zarr dibuat di samping berkas VCF temporer (lihat
+    # _vcf_cache_zarr_path); hapus juga agar tidak menumpuk di /tmp
+    for zarr_path in glob.glob(f"{glob.escape(path)}.*.zarr"):
+        shutil.rmtree(zarr_path, ignore_errors=True)
+    _temp_vcf_registry.discard(path)
+
+
+@atexit.register
+def _cleanup_temp_vcfs():
+    for path in list(_temp_vcf_registry):
+        cleanup_temp_vcf(path)
+
+
+def _write_base64_to_file(content_string, file_obj, chunk_chars=1 << 20):
+    # chunk_chars harus kelipatan 4 agar setiap potongan base64 valid
+    for i in range(0, len(content_string), chunk_chars):
+        file_obj.write(base64.b64decode(content_string[i:i + chunk_chars]))
+
+
+def dataframe_to_split_json(df):
+    if orjson is None:
+        return df.to_json(orient='split')
+    return orjson.dumps({
+        'columns': df.columns.tolist(),
+        'index': df.index.tolist(),
+        'data': df.values.tolist()
+    }).decode()
+
+
+def dataframe_from_split_json(payload):
+    if orjson is None:
+        return pd.read_json(io.StringIO(payload), orient='split')
+    d = orjson.loads(payload)
+    return pd.DataFrame(d['data'], columns=d['columns'], index=d['index'])
+
+
+def dataframe_to_store_payload(df):
+    if pyarrow is not None:
+        buf = io.BytesIO()
+        df.to_feather(buf)
+        return {'format': 'feather', 'data': base64.b64encode(buf.getvalue()).decode()}
+    return {'format': 'json', 'data': dataframe_to_split_json(df)}
+
+
+def dataframe_from_store_payload(payload):
+    if payload.get('format') == 'feather':
+        return pd.read_feather(io.BytesIO(base64.b64decode(payload['data'])))
+    return dataframe_from_split_json(payload['data'])
+
+
+def _read_header_samples(vcf_path, is_gzipped):
+    opener = gzip.open if is_gzipped else open
+    with opener(vcf_path, 'rb') as vcf_handle:
+        for line in vcf_handle:
+            if line.startswith(b'#CHROM'):
+                fields = line.rstrip(b'\r\n').split(b'\t')
+                return [field.decode('utf-8') for field in fields[9:]]
+            if not line.startswith(b'#'):
+                break
+    raise ValueError("Header #CHROM tidak ditemukan dalam berkas VCF.")
+
+
+def _count_vcf_variants(vcf_path, is_gzipped, limit=100000):
+    opener = gzip.open if is_gzipped else open
+    total_variants = 0
+    with opener(vcf_path, 'rb') as vcf_handle:
+        for line in vcf_handle:
+            if line.startswith(b'#'):
+                continue
+            total_variants += 1
+            if total_variants > limit:
+                return ">100.000 (estimasi)"
+    return total_variants
+
+
 def parse_vcf_to_json_summary(contents, filename):
     if contents is None:
         return None, "Tidak ada berkas VCF yang diunggah."
     
     try:
         content_type, content_string = contents.split(',')
-        decoded = base64.b64decode(content_string)
     except Exception as e:
         return None, f"Kesalahan saat mendekode berkas: {str(e)}"
-    
+
     suffix = '.vcf.gz' if filename.endswith('.gz') else '.vcf'
     is_gzipped = suffix == '.vcf.gz'
 
     temp_file_path = None
+    keep_temp_file = False
     try:
         with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix=suffix) as temp_file:
-            temp_file.write(decoded)
             temp_file_path = temp_file.name
-        
+            try:
+                _write_base64_to_file(content_string, temp_file)
+            except Exception as e:
+                return None, f"Kesalahan saat mendekode berkas: {str(e)}"
+
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")
-            vcf_reader = VCF(temp_file_path, strict_gt=False)
-            samples = list(vcf_reader.samples)
-            
-            total_variants = 0
-            for _ in vcf_reader:
-                total_variants += 1
-                if total_variants > 100000:
-                    total_variants = ">100.000 (estimasi)"
-                    break
-            vcf_reader.close()
+            try:
+                samples = _read_header_samples(temp_file_path, is_gzipped)
+            except Exception:
+                vcf_reader = VCF(temp_file_path, strict_gt=False)
+                samples = list(vcf_reader.samples)
+                vcf_reader.close()
+
+            total_variants = _count_vcf_variants(temp_file_path, is_gzipped)
 
             if not samples:
                 return None, f"Tidak ada sampel ditemukan dalam berkas VCF '{filename}'."
@@ -66,8 +176,10 @@ def parse_vcf_to_json_summary(contents, filename):
                 'samples_count': len(samples),
                 'total_variants_summary': str(total_variants),
                 'filename': filename,
-                'vcf_contents_base64': content_string
+                'vcf_temp_path': temp_file_path
             }
+            _register_temp_vcf(temp_file_path)
+            keep_temp_file = True
             return result_data, f"Sampel: {len(samples)}, Varian: {total_variants}."
         
     except Exception as e:
@@ -80,63 +192,75 @@ def parse_vcf_to_json_summary(contents, filename):
             return None, f"Kesalahan: Tidak dapat membuat berkas temporer untuk pemrosesan."
         return None, f"Kesalahan saat memparsing VCF: {error_msg}"
     finally:
-        if temp_file_path and os.path.exists(temp_file_path):
+        if not keep_temp_file and temp_file_path and os.path.exists(temp_file_path):
             try:
                 os.unlink(temp_file_path)
             except:
                 pass
 
 
-def trigger_analysis_pipeline(vcf_contents_base64, filename,
-                              maf_thresh=0.05, snp_miss_thresh=0.2, ind_miss_thresh=0.2, n_pca_components=3):
+_pipeline_executor = None
+
+
+def _get_pipeline_executor():
+    global _pipeline_executor
+    if _pipeline_executor is None:
+        # fork tidak aman setelah kernel numba parallel berjalan di proses
+        # server (threading layer workqueue menggantung di child hasil fork)
+        _pipeline_executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=os.cpu_count(),
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    return _pipeline_executor
+
+
+def _run_pipeline_worker(temp_vcf_path, maf_thresh, snp_miss_thresh, ind_miss_thresh, n_pca_components):
     try:
-        decoded_vcf = base64.b64decode(vcf_contents_base64)
+        gn_imputed_T, samples_qc, snps_orig, snps_qc, samples_orig = stream_vcf_qc(
+            temp_vcf_path,
+            maf_threshold=maf_thresh,
+            snp_missing_threshold=snp_miss_thresh,
+            ind_missing_threshold=ind_miss_thresh
+        )
     except Exception as e:
-        raise RuntimeError(f"Kesalahan saat mendekode berkas VCF: {str(e)}")
-    
-    suffix = '.vcf.gz' if filename.endswith('.gz') else '.vcf'
-    temp_vcf_path = None
+        raise RuntimeError(f"Kesalahan selama kontrol kualitas: {str(e)}")
+
+    if len(samples_qc) < 2:
+        raise ValueError(f"Jumlah sampel tidak cukup untuk PCA setelah QC. Hanya {len(samples_qc)} sampel tersisa (minimal 2 dibutuhkan).")
+    if gn_imputed_T.shape[1] < 1:
+        raise ValueError(f"Tidak ada SNP tersisa setelah QC. Coba sesuaikan ambang batas QC.")
+
+    max_possible_components = min(len(samples_qc) - 1, gn_imputed_T.shape[1])
+
+    actual_n_components = min(n_pca_components, max_possible_components)
+
+    if actual_n_components < 1:
+        if max_possible_components >= 1:
+            actual_n_components = 1
+        else:
+            raise ValueError(f"Data tidak cukup untuk menghitung komponen PCA (sampel setelah QC={len(samples_qc)}, fitur setelah QC={gn_imputed_T.shape[1]}). Perlu minimal 2 sampel dan 1 fitur.")
+
     try:
-        with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix=suffix) as temp_file:
-            temp_file.write(decoded_vcf)
-            temp_vcf_path = temp_file.name
-        
-        try:
-            callset = read_vcf_for_analysis(temp_vcf_path)
-        except Exception as e:
-            raise RuntimeError(f"Kesalahan saat membaca berkas VCF: {str(e)}")
-        
-        try:
-            gn_imputed_T, samples_qc, snps_orig, snps_qc, samples_orig = apply_quality_control(
-                callset,
-                maf_threshold=maf_thresh,
-                snp_missing_threshold=snp_miss_thresh,
-                ind_missing_threshold=ind_miss_thresh
-            )
-        except Exception as e:
-            raise RuntimeError(f"Kesalahan selama kontrol kualitas: {str(e)}")
-        
-        if len(samples_qc) < 2: 
-            raise ValueError(f"Jumlah sampel tidak cukup untuk PCA setelah QC. Hanya {len(samples_qc)} sampel tersisa (minimal 2 dibutuhkan).")
-        if gn_imputed_T.shape[1] < 1: 
-            raise ValueError(f"Tidak ada SNP tersisa setelah QC. Coba sesuaikan ambang batas QC.")
-        
-        max_possible_components = min(len(samples_qc) - 1, gn_imputed_T.shape[1])
-        
-        actual_n_components = min(n_pca_components, max_possible_components)
-        
-        if actual_n_components < 1:
-            if max_possible_components >=1:
-                actual_n_components = 1
-            else: 
-                 raise ValueError(f"Data tidak cukup untuk menghitung komponen PCA (sampel setelah QC={len(samples_qc)}, fitur setelah QC={gn_imputed_T.shape[1]}). Perlu minimal 2 sampel dan 1 fitur.")
-
-        try:
-            pcs, var_ratio = run_pca_analysis(gn_imputed_T, n_components=actual_n_components)
-        except Exception as e:
-            raise RuntimeError(f"Kesalahan selama analisis PCA: {str(e)}")
-        
-        num_pcs_generated = pcs.shape[1] 
+        pcs, var_ratio = run_pca_analysis(gn_imputed_T, n_components=actual_n_components)
+    except Exception as e:
+        raise RuntimeError(f"Kesalahan selama analisis PCA: {str(e)}")
+
+    return pcs, var_ratio, samples_qc, snps_orig, snps_qc, samples_orig
+
+
+def trigger_analysis_pipeline(vcf_temp_path, filename,
+                              maf_thresh=0.05, snp_miss_thresh=0.2, ind_miss_thresh=0.2, n_pca_components=3):
+    if not vcf_temp_path or not os.path.exists(vcf_temp_path):
+        raise RuntimeError("Berkas VCF temporer tidak ditemukan lagi. Silakan unggah ulang berkas VCF.")
+
+    try:
+        future = _get_pipeline_executor().submit(
+            _run_pipeline_worker, vcf_temp_path,
+            maf_thresh, snp_miss_thresh, ind_miss_thresh, n_pca_components
+        )
+        pcs, var_ratio, samples_qc, snps_orig, snps_qc, samples_orig = future.result()
+
+        num_pcs_generated = pcs.shape[1]
         pca_columns = [f'PC{i+1}' for i in range(num_pcs_generated)]
         df_pca_coords = pd.DataFrame(data=pcs[:, :num_pcs_generated], columns=pca_columns)
         df_pca_coords['Sample'] = samples_qc[:len(df_pca_coords)]
@@ -149,7 +273,7 @@ def trigger_analysis_pipeline(vcf_contents_base64, filename,
         }
 
         return {
-            'pca_coords_df_json': df_pca_coords.to_json(orient='split'),
+            'pca_coords_payload': dataframe_to_store_payload(df_pca_coords),
             'variance_explained': var_ratio.tolist(),
             'analysis_summary': analysis_summary
         }
@@ -159,12 +283,6 @@ def trigger_analysis_pipeline(vcf_contents_base64, filename,
             raise e
         else:
             raise RuntimeError(f"Kesalahan tak terduga dalam pipeline analisis: {str(e)}")
-    finally:
-        if temp_vcf_path and os.path.exists(temp_vcf_path):
-            try:
-                os.unlink(temp_vcf_path)
-            except:
-                pass
 
 
 def parse_dataframe_to_json(contents, filename, file_type="CSV/TSV"):
@@ -179,22 +297,20 @@ def parse_dataframe_to_json(contents, filename, file_type="CSV/TSV"):
     
     try:
         if filename.lower().endswith('.q'):
-            df = pd.read_csv(io.StringIO(decoded.decode('utf-8')), sep=r'\s+', header=None, engine='python')
+            df = pd.read_csv(io.BytesIO(decoded), sep=r'\s+', header=None, encoding='utf-8')
         elif filename.lower().endswith(('.evec', '.eigen', '.pca')):
-            df = pd.read_csv(io.StringIO(decoded.decode('utf-8')), sep=r'\s+', header=None, engine='python')
-            try:
-                pd.to_numeric(df.iloc[:, 0])
-            except ValueError:
+            df = pd.read_csv(io.BytesIO(decoded), sep=r'\s+', header=None, encoding='utf-8')
+            if not pd.api.types.is_numeric_dtype(df.iloc[:, 0]):
                 df.index = df.iloc[:, 0]
                 df = df.iloc[:, 1:]
         else:
             try:
-                df = pd.read_csv(io.StringIO(decoded.decode('utf-8')))
+                df = pd.read_csv(io.BytesIO(decoded), encoding='utf-8')
             except:
                 try:
-                    df = pd.read_csv(io.StringIO(decoded.decode('utf-8')), sep='\t')
+                    df = pd.read_csv(io.BytesIO(decoded), sep='\t', encoding='utf-8')
                 except:
-                    df = pd.read_csv(io.StringIO(decoded.decode('utf-8')), sep=r'\s+', engine='python')
+                    df = pd.read_csv(io.BytesIO(decoded), sep=r'\s+', encoding='utf-8')
 
         if df.empty:
             return None, f"Berkas {file_type} '{filename}' kosong."
@@ -207,13 +323,16 @@ def parse_dataframe_to_json(contents, filename, file_type="CSV/TSV"):
                  return None, f"Berkas PCA harus berisi data numerik untuk komponen utama."
                 
         elif file_type == "ADMIXTURE":
-            if df.select_dtypes(include=[np.number]).shape[1] > 0:
-                numeric_data = df.select_dtypes(include=[np.number])
-                if not ((numeric_data >= 0) & (numeric_data <= 1)).all().all():
+            numeric_data = df.select_dtypes(include=[np.number])
+            if numeric_data.shape[1] > 0:
+                arr = numeric_data.to_numpy()
+                if np.isnan(arr).any() or arr.min() < 0 or arr.max() > 1:
                     return None, f"Berkas ADMIXTURE harus berisi proporsi antara 0 dan 1."
-                row_sums = numeric_data.sum(axis=1)
-                if not np.allclose(row_sums, 1.0, atol=0.01): 
-                    return None, f"Proporsi ADMIXTURE harus berjumlah mendekati 1 untuk setiap sampel."
+                row_sums = arr.sum(axis=1)
+                if not np.allclose(row_sums, 1.0, atol=0.01):
+                    rmin, rmax = np.min(row_sums), np.max(row_sums)
+                    return None, (f"Proporsi ADMIXTURE harus berjumlah mendekati 1 untuk setiap sampel "
+                                  f"(jumlah baris ditemukan antara {rmin:.3f} dan {rmax:.3f}).")
         
         return df.to_json(date_format='iso', orient='split'), f"Berkas {file_type} '{filename}' berhasil dimuat. Bentuk: {df.shape}."
     
@@ -244,7 +363,25 @@ def parse_pooled_data(contents, filename):
         return None, f"Kesalahan saat mendekode berkas: {str(e)}"
     
     try:
-        df = pd.read_csv(io.StringIO(decoded.decode('utf-8')), sep=r'\s+', engine='python')
+        df = None
+        if pacsv is not None:
+            try:
+                table = pacsv.read_csv(
+                    io.BytesIO(decoded),
+                    parse_options=pacsv.ParseOptions(delimiter=' '),
+                    read_options=pacsv.ReadOptions(use_threads=True)
+                )
+                df = table.to_pandas()
+                # pyarrow tidak gagal pada pemisah tab/multi-spasi, hanya
+                # menghasilkan kolom kacau; validasi dulu sebelum dipakai
+                has_ref = any(str(col).startswith('reference_count_') for col in df.columns)
+                has_depth = any(str(col).startswith('pool_depth_') for col in df.columns)
+                if df.shape[1] < 2 or not (has_ref and has_depth):
+                    df = None
+            except Exception:
+                df = None
+        if df is None:
+            df = pd.read_csv(io.BytesIO(decoded), sep=r'\s+', encoding='utf-8')
 
         if df.empty:
             return None, "Berkas pooled data kosong."
@@ -286,7 +423,7 @@ def parse_pooled_data(contents, filename):
                 if invalid_rows_mask.any():
                     return None, f"Untuk pool {suffix}, ditemukan reference_count > pool_depth pada beberapa baris. Ini tidak valid."
 
-        return df.to_json(orient='split'), f"Berkas pooled data '{filename}' berhasil dimuat. SNPs: {len(df)}, Pools: {len(ref_cols)}."
+        return dataframe_to_split_json(df), f"Berkas pooled data '{filename}' berhasil dimuat. SNPs: {len(df)}, Pools: {len(ref_cols)}."
     
     except Exception as e:
         print(f"ERROR: Unhandled exception in parse_pooled_data for {filename}: {type(e).__name__} - {str(e)}")
@@ -297,7 +434,7 @@ def parse_pooled_data(contents, filename):
 
 def analyze_fst_from_pooled_data(pooled_df_json, min_depth=10):
     try:
-        df = pd.read_json(io.StringIO(pooled_df_json), orient='split')
+        df = dataframe_from_split_json(pooled_df_json)
         num_snps_input = len(df)
         
         fst_matrix_df = create_fst_matrix(df, min_depth=int(min_depth))
@@ -334,7 +471,7 @@ def analyze_fst_from_pooled_data(pooled_df_json, min_depth=10):
             ]
 
         return {
-            'fst_matrix': fst_matrix_df.to_json(orient='split'),
+            'fst_matrix': dataframe_to_split_json(fst_matrix_df),
             'fst_summary_stats': fst_summary_stats,
             'fst_value_distribution_table_data': fst_value_distribution_table_data
         }
@@ -1,138 +1,203 @@
 import numpy as np
 import pandas as pd
 import warnings
+import os
+import concurrent.futures
+
+try:
+    import numba
+except ImportError:
+    numba = None
 
 
 def extract_pool_names(df):
-    ref_cols = [col for col in df.columns if col.startswith('reference_count_')]
-    pool_names = [col.replace('reference_count_', '') for col in ref_cols]
-    return sorted(pool_names)
+    cols = df.columns.to_numpy(dtype=str)
+    ref_mask = np.char.startswith(cols, 'reference_count_')
+    pool_names = np.char.replace(cols[ref_mask], 'reference_count_', '')
+    return sorted(pool_names.tolist())
+
+
+def extract_pool_arrays(df):
+    pools = extract_pool_names(df)
+    ref_matrix = np.ascontiguousarray(
+        df[[f'reference_count_{p}' for p in pools]].to_numpy(dtype=np.float32).T)
+    depth_matrix = np.ascontiguousarray(
+        df[[f'pool_depth_{p}' for p in pools]].to_numpy(dtype=np.float32).T)
+    return pools, ref_matrix, depth_matrix
+
+
+def _freqs_from_arrays(ref_counts, depths):
+    valid_mask = depths > 0
+    freqs = np.zeros_like(ref_counts, dtype=np.float32)
+    np.divide(ref_counts, depths, out=freqs, where=valid_mask)
+    return freqs, valid_mask
+
 
 def calculate_allele_frequencies(df, pool_name):
     ref_col = f'reference_count_{pool_name}'
     depth_col = f'pool_depth_{pool_name}'
-    
+
     if ref_col not in df.columns or depth_col not in df.columns:
         raise ValueError(f"Missing columns for pool {pool_name}")
-    
-    ref_counts = df[ref_col].values
-    depths = df[depth_col].values
-
-    valid_mask = depths > 0
-    
-    freqs = np.zeros(len(df))
-    freqs[valid_mask] = ref_counts[valid_mask] / depths[valid_mask]
-    
-    return freqs, valid_mask
-
 
-def calculate_pairwise_fst(df, pool1, pool2, min_depth=10):
-    try:
-        freq1, mask1 = calculate_allele_frequencies(df, pool1)
-        freq2, mask2 = calculate_allele_frequencies(df, pool2)
-        
-        depth1 = df[f'pool_depth_{pool1}'].values
-        depth2 = df[f'pool_depth_{pool2}'].values
-        
-        qualifying_snps_mask = mask1 & mask2 & (depth1 >= min_depth) & (depth2 >= min_depth)
-        num_qualifying_snps = qualifying_snps_mask.sum()
-        
-        if num_qualifying_snps < 10:
-            return np.nan
-        
-        p1 = freq1[qualifying_snps_mask]
-        p2 = freq2[qualifying_snps_mask]
-        n1 = depth1[qualifying_snps_mask]
-        n2 = depth2[qualifying_snps_mask]
-
-        p_bar = (n1 * p1 + n2 * p2) / (n1 + n2)
-    
-        s2_1 = p1 * (1 - p1)
-        s2_2 = p2 * (1 - p2)
-        s2_denominator = n1 + n2 -1
-        s2_denominator_is_problem = (s2_denominator <= 0) | np.isnan(s2_denominator)
-        s2 = np.full_like(s2_denominator, np.nan, dtype=float)
-        s2[~s2_denominator_is_problem] = (n1[~s2_denominator_is_problem] * s2_1[~s2_denominator_is_problem] + n2[~s2_denominator_is_problem] * s2_2[~s2_denominator_is_problem]) / s2_denominator[~s2_denominator_is_problem]
-
-        nc_denominator = n1 + n2
-        nc_val = n1 + n2 - (n1**2 + n2**2) / nc_denominator
-        nc_minus_1 = nc_val -1
-        nc_minus_1_is_problem = (nc_minus_1 <= 0) | np.isnan(nc_minus_1)
-
-        correction_denom = (2*(n1+n2)-1)
-        correction_denom_is_problem = (correction_denom <=0) | np.isnan(correction_denom)
-        correction_term = np.full_like(correction_denom, np.nan, dtype=float)
-        correction_term[~correction_denom_is_problem] = (1/correction_denom[~correction_denom_is_problem]) * \
-            (n1[~correction_denom_is_problem]*p1[~correction_denom_is_problem]*(1-p1[~correction_denom_is_problem]) + \
-             n2[~correction_denom_is_problem]*p2[~correction_denom_is_problem]*(1-p2[~correction_denom_is_problem]))
-
-        a = np.full_like(nc_val, np.nan, dtype=float)
-        a_valid_mask = ~nc_minus_1_is_problem & ~np.isnan(s2) & ~np.isnan(correction_term)
-        a[a_valid_mask] = (nc_val[a_valid_mask] / nc_minus_1[a_valid_mask]) * (s2[a_valid_mask] - correction_term[a_valid_mask])
-        
-        b = np.full_like(correction_term, np.nan, dtype=float)
-        b_valid_mask = ~np.isnan(correction_term)
-        b[b_valid_mask] = correction_term[b_valid_mask]
+    ref_counts = df[ref_col].to_numpy(dtype=np.float32)
+    depths = df[depth_col].to_numpy(dtype=np.float32)
 
-        c = 0.5 * (p1 - p2)**2
+    return _freqs_from_arrays(ref_counts, depths)
 
-        numerator_fst = a + b + c
-        denominator_fst = a + b + c + s2
-        
-        fst_per_locus = np.full_like(numerator_fst, np.nan, dtype=float)
-
-        non_nan_components_mask = ~np.isnan(numerator_fst) & ~np.isnan(denominator_fst)
-        
-        calc_mask = non_nan_components_mask & (denominator_fst != 0)
-        fst_per_locus[calc_mask] = numerator_fst[calc_mask] / denominator_fst[calc_mask]
-        
-        zero_zero_mask = non_nan_components_mask & (denominator_fst == 0) & (numerator_fst == 0)
-        fst_per_locus[zero_zero_mask] = 0.0
-        
-        zero_nonzero_mask = non_nan_components_mask & (denominator_fst == 0) & (numerator_fst != 0)
-        fst_per_locus[zero_nonzero_mask] = 1.0
-        
-        fst_per_locus = np.clip(fst_per_locus, 0, 1)
-        
-        weights = n1 + n2 
-        
-        valid_indices_for_avg = ~np.isnan(fst_per_locus) & ~np.isnan(weights)
-        actual_fst_values = fst_per_locus[valid_indices_for_avg]
-        actual_weights = weights[valid_indices_for_avg]
-
-        if len(actual_fst_values) == 0 or np.sum(actual_weights) == 0 or np.isnan(np.sum(actual_weights)):
-            return np.nan
 
-        weighted_fst = np.sum(actual_fst_values * actual_weights) / np.sum(actual_weights)
-        final_fst = np.clip(weighted_fst, 0, 1)
-        return final_fst
+def calculate_pairwise_fst(freq1, mask1, depth1, freq2, mask2, depth2, min_depth=10):
+    try:
+        invalid = ~(mask1 & mask2)
+        depth1 = np.where(invalid, 0, depth1)
+        depth2 = np.where(invalid, 0, depth2)
+        return _pairwise_fst_single(freq1, freq2, depth1, depth2, min_depth)
 
     except Exception as e_calc:
-        print(f"CRITICAL ERROR in calculate_pairwise_fst for {pool1} vs {pool2}: {type(e_calc).__name__} - {str(e_calc)}")
+        print(f"CRITICAL ERROR in calculate_pairwise_fst: {type(e_calc).__name__} - {str(e_calc)}")
         import traceback
         print("Full Traceback for calculate_pairwise_fst:")
         traceback.print_exc()
         raise
 
 
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _pairwise_fst_kernel(p1, p2, n1, n2, min_depth):
+        sum_weighted_fst = 0.0
+        sum_weights = 0.0
+        num_qualifying = 0
+        for k in numba.prange(p1.shape[0]):
+            n1k = float(n1[k])
+            n2k = float(n2[k])
+            if n1k < min_depth or n2k < min_depth:
+                continue
+            num_qualifying += 1
+            n_total = n1k + n2k
+            if n_total <= 1.0:
+                continue
+            nc = n_total - (n1k * n1k + n2k * n2k) / n_total
+            if nc - 1.0 <= 0.0:
+                continue
+            p1k = float(p1[k])
+            p2k = float(p2[k])
+            p_var = n1k * p1k * (1.0 - p1k) + n2k * p2k * (1.0 - p2k)
+            s2 = p_var / (n_total - 1.0)
+            correction_term = p_var / (2.0 * n_total - 1.0)
+            a = (nc / (nc - 1.0)) * (s2 - correction_term)
+            b = correction_term
+            c = 0.5 * (p1k - p2k)**2
+            numerator = a + b + c
+            denominator = numerator + s2
+            if denominator != 0.0:
+                fst = numerator / denominator
+            elif numerator == 0.0:
+                fst = 0.0
+            else:
+                fst = 1.0
+            if fst < 0.0:
+                fst = 0.0
+            elif fst > 1.0:
+                fst = 1.0
+            sum_weighted_fst += fst * n_total
+            sum_weights += n_total
+        if num_qualifying < 10 or sum_weights <= 0.0:
+            return np.nan
+        weighted_fst = sum_weighted_fst / sum_weights
+        if weighted_fst < 0.0:
+            weighted_fst = 0.0
+        elif weighted_fst > 1.0:
+            weighted_fst = 1.0
+        return weighted_fst
+
+
+def _pairwise_fst_single(p1, p2, n1, n2, min_depth):
+    if numba is not None:
+        return float(_pairwise_fst_kernel(p1, p2, n1, n2, float(min_depth)))
+    return float(_pairwise_fst_batch(
+        np.atleast_2d(p1), np.atleast_2d(p2),
+        np.atleast_2d(n1), np.atleast_2d(n2),
+        min_depth
+    )[0])
+
+
+def _pairwise_fst_batch(p1, p2, n1, n2, min_depth):
+    qualifying = (n1 >= min_depth) & (n2 >= min_depth)
+    num_qualifying = qualifying.sum(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        n_total = n1 + n2
+        p_var = n1 * p1 * (1 - p1) + n2 * p2 * (1 - p2)
+        s2 = p_var / (n_total - 1)
+        nc = n_total - (n1**2 + n2**2) / n_total
+        correction_term = p_var / (2 * n_total - 1)
+
+        a = (nc / (nc - 1)) * (s2 - correction_term)
+        b = correction_term
+        c = 0.5 * (p1 - p2)**2
+
+        numerator_fst = a + b + c
+        denominator_fst = numerator_fst + s2
+        fst_per_locus = np.where(
+            denominator_fst != 0,
+            numerator_fst / denominator_fst,
+            np.where(numerator_fst == 0, 0.0, 1.0)
+        )
+    fst_per_locus = np.clip(fst_per_locus, 0, 1)
+
+    weights = n_total
+    valid = qualifying & ~np.isnan(fst_per_locus)
+    sum_weights = np.where(valid, weights, 0).sum(axis=1, dtype=np.float64)
+    sum_weighted_fst = np.where(valid, fst_per_locus * weights, 0).sum(axis=1, dtype=np.float64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fst_pairs = np.clip(sum_weighted_fst / sum_weights, 0, 1)
+    fst_pairs = np.where((num_qualifying < 10) | (sum_weights <= 0), np.nan, fst_pairs)
+    return fst_pairs
+
+
 def create_fst_matrix(df, min_depth=10):
     print(f"DEBUG: create_fst_matrix called. min_depth={min_depth}. df shape: {df.shape}")
-    pools = extract_pool_names(df)
+    pools, ref_matrix, depth_matrix = extract_pool_arrays(df)
     n_pools = len(pools)
     print(f"DEBUG: create_fst_matrix - Number of pools: {n_pools}, Pool names: {pools}")
-    
+
+    freq_matrix, _ = _freqs_from_arrays(ref_matrix, depth_matrix)
+
     fst_matrix = np.full((n_pools, n_pools), np.nan)
-    
-    for i in range(n_pools):
-        fst_matrix[i, i] = 0.0
-        for j in range(i + 1, n_pools):
-            try:
-                fst = calculate_pairwise_fst(df, pools[i], pools[j], min_depth=int(min_depth))
-                fst_matrix[i, j] = fst
-                fst_matrix[j, i] = fst
-            except Exception as e_pair:
-                print(f"ERROR: create_fst_matrix - Error during FST calculation for pair {pools[i]} vs {pools[j]}: {type(e_pair).__name__} - {str(e_pair)}")
-                raise
-    
+    np.fill_diagonal(fst_matrix, 0.0)
+
+    idx_i, idx_j = np.triu_indices(n_pools, k=1)
+    if len(idx_i) > 0:
+        try:
+            if numba is not None:
+                fst_pairs = np.empty(len(idx_i))
+                for k in range(len(idx_i)):
+                    i, j = idx_i[k], idx_j[k]
+                    fst_pairs[k] = _pairwise_fst_kernel(
+                        freq_matrix[i], freq_matrix[j],
+                        depth_matrix[i], depth_matrix[j],
+                        float(min_depth)
+                    )
+            else:
+                fst_pairs = np.empty(len(idx_i))
+                n_workers = os.cpu_count() or 1
+                pair_chunks = np.array_split(np.arange(len(idx_i)), min(len(idx_i), n_workers * 4))
+
+                def _fst_pair_chunk(selection):
+                    fst_pairs[selection] = _pairwise_fst_batch(
+                        freq_matrix[idx_i[selection]], freq_matrix[idx_j[selection]],
+                        depth_matrix[idx_i[selection]], depth_matrix[idx_j[selection]],
+                        int(min_depth)
+                    )
+
+                with concurrent.futures.ThreadPoolExecutor(max_workers=n_workers) as executor:
+                    list(executor.map(_fst_pair_chunk, pair_chunks))
+        except Exception as e_batch:
+            print(f"ERROR: create_fst_matrix - Error during batched FST calculation: {type(e_batch).__name__} - {str(e_batch)}")
+            raise
+        fst_matrix[idx_i, idx_j] = fst_pairs
+        fst_matrix[idx_j, idx_i] = fst_pairs
+
     result_df = pd.DataFrame(fst_matrix, index=pools, columns=pools)
     return result_df
\ No newline at end of file
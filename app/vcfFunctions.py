@@ -2,9 +2,30 @@ import allel
 import numpy as np
 import pandas as pd
 from sklearn.decomposition import PCA
-from sklearn.impute import SimpleImputer
+from sklearn.utils.extmath import randomized_svd
+from scipy.linalg import eigh
+from scipy.sparse.linalg import svds
 import warnings
-from sklearn.preprocessing import StandardScaler
+import os
+import gc
+import joblib
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+try:
+    import zarr
+except ImportError:
+    zarr = None
+
+try:
+    import cupy
+    import cuml
+except ImportError:
+    cupy = None
+    cuml = None
 
 
 def read_vcf_for_analysis(vcf_path):
@@ -12,10 +33,16 @@ def read_vcf_for_analysis(vcf_path):
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")
             
-            callset = allel.read_vcf(vcf_path, fields=['samples', 'calldata/GT', 'variants/CHROM', 'variants/POS'])
-            
+            callset = allel.read_vcf(
+                vcf_path,
+                fields=['samples', 'calldata/GT', 'variants/CHROM', 'variants/POS'],
+                numbers={'GT': 2},
+                types={'calldata/GT': 'i1'},
+                chunk_length=65536
+            )
+
             if callset is None:
-                callset = allel.read_vcf(vcf_path, fields='*', numbers={'GT': 2})
+                callset = allel.read_vcf(vcf_path, fields='*', numbers={'GT': 2}, types={'calldata/GT': 'i1'})
             
             if callset is None:
                 raise ValueError("Tidak dapat membaca berkas VCF. Berkas mungkin rusak atau dalam format yang tidak didukung.")
@@ -43,63 +70,358 @@ def read_vcf_for_analysis(vcf_path):
             raise ValueError(f"Kesalahan saat membaca berkas VCF: {str(e)}")
 
 
+if numba is not None:
+    @numba.njit(parallel=True, cache=True)
+    def _impute_to_f32_kernel(gn, means):
+        n_snps, n_samples = gn.shape
+        out = np.empty((n_samples, n_snps), dtype=np.float32)
+        for j in numba.prange(n_samples):
+            for i in range(n_snps):
+                v = gn[i, j]
+                if v == -1:
+                    out[j, i] = means[i]
+                else:
+                    out[j, i] = np.float32(v)
+        return out
+
+
+def impute_genotypes_transposed(gn):
+    missing_mask = gn == -1
+    sums = np.where(missing_mask, 0, gn).sum(axis=1, dtype=np.float64)
+    counts = (~missing_mask).sum(axis=1)
+    means = (sums / np.maximum(counts, 1)).astype(np.float32)
+    if numba is not None:
+        return _impute_to_f32_kernel(np.ascontiguousarray(gn), means)
+    n_snps, n_samples = gn.shape
+    out = np.empty((n_samples, n_snps), dtype=np.float32)
+    np.copyto(out, gn.T)
+    np.copyto(out, np.broadcast_to(means, out.shape), where=missing_mask.T)
+    return out
+
+
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _standardize_inplace_kernel(X):
+        n, d = X.shape
+        for j in numba.prange(d):
+            m = 0.0
+            m2 = 0.0
+            for i in range(n):
+                x = float(X[i, j])
+                delta = x - m
+                m += delta / (i + 1)
+                m2 += delta * (x - m)
+            s = np.sqrt(m2 / n)
+            if s == 0.0:
+                s = 1.0
+            for i in range(n):
+                X[i, j] = (X[i, j] - m) / s
+
+
+def standardize_inplace(X):
+    if numba is not None:
+        _standardize_inplace_kernel(X)
+        return X
+    mu = X.mean(axis=0, dtype=np.float64)
+    X -= mu
+    sd = X.std(axis=0)
+    sd[sd == 0] = 1.0
+    X /= sd
+    return X
+
+
+if numba is not None:
+    @numba.njit(parallel=True, cache=True)
+    def _variant_qc_stats_kernel(gt_arr):
+        n_variants, n_samples, ploidy = gt_arr.shape
+        n_ref = np.zeros(n_variants, dtype=np.int64)
+        n_alt = np.zeros(n_variants, dtype=np.int64)
+        n_other = np.zeros(n_variants, dtype=np.int64)
+        n_missing = np.zeros(n_variants, dtype=np.int64)
+        for i in numba.prange(n_variants):
+            ref = 0
+            alt = 0
+            other = 0
+            miss = 0
+            for j in range(n_samples):
+                call_missing = False
+                for k in range(ploidy):
+                    v = gt_arr[i, j, k]
+                    if v < 0:
+                        call_missing = True
+                    elif v == 0:
+                        ref += 1
+                    elif v == 1:
+                        alt += 1
+                    else:
+                        other += 1
+                if call_missing:
+                    miss += 1
+            n_ref[i] = ref
+            n_alt[i] = alt
+            n_other[i] = other
+            n_missing[i] = miss
+        return n_ref, n_alt, n_other, n_missing
+
+
+def _dosages_constant(gn):
+    n_distinct = 0
+    for val in (0, 1, 2):
+        if np.any(gn == val):
+            n_distinct += 1
+            if n_distinct > 1:
+                return False
+    return True
+
+
+def _to_n_alt_int8(gt_arr):
+    gn = (gt_arr > 0).sum(axis=2).astype(np.int8)
+    gn[np.any(gt_arr < 0, axis=2)] = -1
+    return gn
+
+
+def _variant_qc_stats_numpy(gt_arr):
+    gt_flat = gt_arr.reshape(gt_arr.shape[0], -1)
+    n_ref = np.count_nonzero(gt_flat == 0, axis=1)
+    n_alt = np.count_nonzero(gt_flat == 1, axis=1)
+    n_other = np.count_nonzero(gt_flat > 1, axis=1)
+    n_missing = np.count_nonzero((gt_arr < 0).any(axis=2), axis=1)
+    return n_ref, n_alt, n_other, n_missing
+
+
+def _variant_qc_stats(gt_arr):
+    if numba is not None:
+        return _variant_qc_stats_kernel(np.ascontiguousarray(gt_arr))
+    n_jobs = os.cpu_count() or 1
+    if n_jobs > 1 and gt_arr.shape[0] >= 4 * n_jobs:
+        chunks = np.array_split(gt_arr, n_jobs, axis=0)
+        results = joblib.Parallel(n_jobs=n_jobs, prefer='threads')(
+            joblib.delayed(_variant_qc_stats_numpy)(c) for c in chunks)
+        return tuple(np.concatenate(parts) for parts in zip(*results))
+    return _variant_qc_stats_numpy(gt_arr)
+
+
+def _vcf_cache_zarr_path(vcf_path):
+    st = os.stat(vcf_path)
+    return f"{vcf_path}.{st.st_size}-{int(st.st_mtime)}.zarr"
+
+
+def _vcf_chunk_source(vcf_path, chunk_length=65536):
+    if zarr is not None:
+        try:
+            zarr_path = _vcf_cache_zarr_path(vcf_path)
+            if not os.path.exists(zarr_path):
+                allel.vcf_to_zarr(
+                    vcf_path, zarr_path,
+                    fields=['samples', 'calldata/GT'],
+                    numbers={'GT': 2},
+                    types={'calldata/GT': 'i1'},
+                    chunk_length=chunk_length,
+                    chunk_width=200
+                )
+            root = zarr.open(zarr_path, mode='r')
+            samples = np.asarray(root['samples'][:])
+            gt_z = root['calldata/GT']
+
+            def zarr_chunks():
+                for start in range(0, gt_z.shape[0], chunk_length):
+                    yield np.asarray(gt_z[start:start + chunk_length])
+
+            return samples, zarr_chunks()
+        except Exception as e:
+            print(f"Peringatan: cache Zarr gagal, kembali membaca VCF langsung: {str(e)}")
+
+    _fields, samples, _headers, chunk_iter = allel.iter_vcf_chunks(
+        vcf_path,
+        fields=['calldata/GT'],
+        numbers={'GT': 2},
+        types={'calldata/GT': 'i1'},
+        chunk_length=chunk_length
+    )
+
+    def vcf_chunks():
+        for chunk, _chunk_len, _chrom, _pos in chunk_iter:
+            yield chunk['calldata/GT']
+
+    return np.asarray(samples), vcf_chunks()
+
+
+def stream_vcf_qc(vcf_path, maf_threshold=0.05, snp_missing_threshold=0.2, ind_missing_threshold=0.2):
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            samples, gt_chunks = _vcf_chunk_source(vcf_path)
+    except Exception as e:
+        if "codec" in str(e).lower():
+            raise ValueError(f"Kesalahan pengkodean berkas VCF. Pastikan berkas dalam format UTF-8: {str(e)}")
+        elif "not a valid VCF" in str(e):
+            raise ValueError(f"Format berkas VCF tidak valid: {str(e)}")
+        else:
+            raise ValueError(f"Kesalahan saat membaca berkas VCF: {str(e)}")
+
+    samples_arr = np.asarray(samples)
+    samples_original_count = len(samples_arr)
+    if samples_original_count == 0:
+        raise ValueError("Tidak ada sampel ditemukan dalam berkas VCF.")
+
+    kept_chunks = []
+    sample_missing = np.zeros(samples_original_count, dtype=np.int64)
+    snps_original_count = 0
+    n_biallelic = 0
+    n_maf_pass = 0
+    max_maf_val = 0.0
+    min_missing_after_maf = 1.0
+
+    try:
+        for gt_chunk in gt_chunks:
+            gt_chunk = np.ascontiguousarray(gt_chunk)
+            snps_original_count += gt_chunk.shape[0]
+
+            n_ref, n_alt, n_other, n_missing = _variant_qc_stats(gt_chunk)
+
+            biallelic_mask = (n_ref > 0) & (n_alt > 0) & (n_other == 0)
+            n_biallelic += int(biallelic_mask.sum())
+
+            allele_total = n_ref + n_alt + n_other
+            with np.errstate(divide='ignore', invalid='ignore'):
+                aaf = np.where(allele_total > 0, n_alt / allele_total, 0.0)
+
+            maf_mask = biallelic_mask & (aaf > maf_threshold) & (aaf < (1 - maf_threshold))
+            n_maf_pass += int(maf_mask.sum())
+
+            aaf_bi = aaf[biallelic_mask]
+            aaf_bi = aaf_bi[aaf_bi < 0.5]
+            if aaf_bi.size > 0:
+                max_maf_val = max(max_maf_val, float(aaf_bi.max()))
+
+            missing_snp_prop = n_missing / gt_chunk.shape[1]
+            final_snp_mask = maf_mask & (missing_snp_prop < snp_missing_threshold)
+
+            missing_after_maf = missing_snp_prop[maf_mask]
+            if missing_after_maf.size > 0:
+                min_missing_after_maf = min(min_missing_after_maf, float(missing_after_maf.min()))
+
+            if final_snp_mask.any():
+                gt_keep = np.compress(final_snp_mask, gt_chunk, axis=0)
+                kept_chunks.append(gt_keep)
+                sample_missing += (gt_keep < 0).any(axis=2).sum(axis=0)
+    except ValueError:
+        raise
+    except Exception as e:
+        raise ValueError(f"Kesalahan saat membaca berkas VCF: {str(e)}")
+
+    if snps_original_count == 0:
+        raise ValueError("Tidak ada varian ditemukan dalam berkas VCF.")
+    if n_biallelic == 0:
+        # pengkodean alel mungkin bukan 0/1; ulangi lewat jalur non-streaming
+        # yang masih punya fallback count_alleles().is_biallelic()
+        print("QC streaming tidak menemukan SNP biallelic 0/1, mencoba jalur non-streaming")
+        return apply_quality_control(
+            read_vcf_for_analysis(vcf_path),
+            maf_threshold=maf_threshold,
+            snp_missing_threshold=snp_missing_threshold,
+            ind_missing_threshold=ind_missing_threshold
+        )
+    if n_maf_pass == 0:
+        raise ValueError(f"Tidak ada SNP lolos filter MAF (ambang batas: {maf_threshold}). "
+                         f"MAF maksimum dalam dataset (setelah filter biallelic): {max_maf_val:.3f}")
+    if not kept_chunks:
+        raise ValueError(f"Tidak ada SNP lolos filter data hilang (ambang batas: {snp_missing_threshold}). "
+                         f"Minimum data hilang SNP (setelah filter MAF): {min_missing_after_maf:.3f}")
+
+    gt_snp_filtered = np.concatenate(kept_chunks, axis=0)
+    kept_chunks.clear()
+
+    print(f"QC streaming: {snps_original_count} SNP dibaca, {n_biallelic} biallelic, "
+          f"{n_maf_pass} lolos filter MAF, {gt_snp_filtered.shape[0]} lolos filter data hilang SNP")
+
+    missing_ind_prop = sample_missing / gt_snp_filtered.shape[0]
+    ind_missing_filter = missing_ind_prop < ind_missing_threshold
+    gt_qc = np.compress(ind_missing_filter, gt_snp_filtered, axis=1)
+    del gt_snp_filtered
+    samples_after_qc = samples_arr[ind_missing_filter].tolist()
+
+    if gt_qc.shape[1] == 0:
+        min_missing = 1.0
+        if len(missing_ind_prop) > 0:
+            min_missing = float(missing_ind_prop.min())
+        raise ValueError(f"Tidak ada sampel lolos filter data hilang (ambang batas: {ind_missing_threshold}). "
+                         f"Minimum data hilang sampel (setelah filter SNP): {min_missing:.3f}")
+
+    print(f"Setelah filter data hilang individu: {gt_qc.shape[1]} sampel")
+
+    snps_after_qc_count = gt_qc.shape[0]
+
+    gn = _to_n_alt_int8(gt_qc)
+    del gt_qc
+
+    if _dosages_constant(gn):
+        raise ValueError("Tidak ada variasi genetik tersisa setelah QC (semua genotipe sama atau hilang).")
+
+    gn_imputed_transposed = impute_genotypes_transposed(gn)
+    del gn
+    gc.collect()
+
+    return gn_imputed_transposed, samples_after_qc, snps_original_count, snps_after_qc_count, samples_original_count
+
+
 def apply_quality_control(callset, maf_threshold=0.05, snp_missing_threshold=0.2, ind_missing_threshold=0.2):
     try:
-        gt = allel.GenotypeArray(callset['calldata/GT'])
-        samples_original = callset['samples'].tolist()
-        snps_original_count = gt.shape[0]
-        samples_original_count = gt.shape[1]
-        
+        gt_arr = np.asarray(callset['calldata/GT'])
+        samples_arr = np.asarray(callset['samples'])
+        snps_original_count = gt_arr.shape[0]
+        samples_original_count = gt_arr.shape[1]
+
         print(f"Memulai QC dengan {snps_original_count} SNP dan {samples_original_count} sampel")
-        
-        ac = gt.count_alleles()
-        is_biallelic_01 = ac.is_biallelic_01()
-        gt_bi = gt[is_biallelic_01]
-        
-        if gt_bi.shape[0] == 0:
-            is_biallelic = ac.is_biallelic()
+
+        n_ref, n_alt, n_other, n_missing = _variant_qc_stats(gt_arr)
+
+        biallelic_mask = (n_ref > 0) & (n_alt > 0) & (n_other == 0)
+
+        if biallelic_mask.sum() == 0:
+            is_biallelic = allel.GenotypeArray(gt_arr).count_alleles().is_biallelic()
             if is_biallelic.sum() > 0:
-                gt_bi = gt[is_biallelic]
+                biallelic_mask = np.asarray(is_biallelic)
             else:
                 raise ValueError("Tidak ada SNP biallelic ditemukan dalam dataset.")
-        
-        print(f"Setelah filter biallelic: {gt_bi.shape[0]} SNP")
-        
-        ac_bi = gt_bi.count_alleles()
-        
-        with np.errstate(divide='ignore', invalid='ignore'): 
-            aaf = ac_bi.to_frequencies()[:, 1]
-            aaf = np.where(np.isnan(aaf), 0, aaf) 
-        
-        maf_filter = (aaf > maf_threshold) & (aaf < (1 - maf_threshold))
-        gt_maf = gt_bi[maf_filter]
-        
-        if gt_maf.shape[0] == 0:
+
+        print(f"Setelah filter biallelic: {biallelic_mask.sum()} SNP")
+
+        allele_total = n_ref + n_alt + n_other
+        with np.errstate(divide='ignore', invalid='ignore'):
+            aaf = np.where(allele_total > 0, n_alt / allele_total, 0.0)
+
+        maf_mask = biallelic_mask & (aaf > maf_threshold) & (aaf < (1 - maf_threshold))
+
+        if maf_mask.sum() == 0:
+            aaf_bi = aaf[biallelic_mask]
             max_maf_val = 0
-            if len(aaf[aaf < 0.5]) > 0 : 
-                max_maf_val = aaf[aaf < 0.5].max()
+            if len(aaf_bi[aaf_bi < 0.5]) > 0 :
+                max_maf_val = aaf_bi[aaf_bi < 0.5].max()
             raise ValueError(f"Tidak ada SNP lolos filter MAF (ambang batas: {maf_threshold}). "
                            f"MAF maksimum dalam dataset (setelah filter biallelic): {max_maf_val:.3f}")
-        
-        print(f"Setelah filter MAF: {gt_maf.shape[0]} SNP")
-        
-        missing_snp_prop = gt_maf.count_missing(axis=1) / gt_maf.shape[1]
-        snp_missing_filter = missing_snp_prop < snp_missing_threshold
-        gt_snp_filtered = gt_maf[snp_missing_filter]
-        
-        if gt_snp_filtered.shape[0] == 0:
-            min_missing = 1.0 
-            if len(missing_snp_prop) > 0: 
-                 min_missing = missing_snp_prop.min()
+
+        print(f"Setelah filter MAF: {maf_mask.sum()} SNP")
+
+        missing_snp_prop = n_missing / gt_arr.shape[1]
+        final_snp_mask = maf_mask & (missing_snp_prop < snp_missing_threshold)
+
+        if final_snp_mask.sum() == 0:
+            min_missing = 1.0
+            missing_after_maf = missing_snp_prop[maf_mask]
+            if len(missing_after_maf) > 0:
+                 min_missing = missing_after_maf.min()
             raise ValueError(f"Tidak ada SNP lolos filter data hilang (ambang batas: {snp_missing_threshold}). "
                            f"Minimum data hilang SNP (setelah filter MAF): {min_missing:.3f}")
-        
+
+        gt_snp_filtered = np.compress(final_snp_mask, gt_arr, axis=0)
         print(f"Setelah filter data hilang SNP: {gt_snp_filtered.shape[0]} SNP")
-        
-        missing_ind_prop = gt_snp_filtered.count_missing(axis=0) / gt_snp_filtered.shape[0]
+
+        missing_ind_prop = (gt_snp_filtered < 0).any(axis=2).sum(axis=0) / gt_snp_filtered.shape[0]
         ind_missing_filter = missing_ind_prop < ind_missing_threshold
-        gt_qc = gt_snp_filtered.compress(ind_missing_filter, axis=1)
-        samples_after_qc = np.array(samples_original)[ind_missing_filter].tolist()
+        gt_qc = np.compress(ind_missing_filter, gt_snp_filtered, axis=1)
+        del gt_snp_filtered
+        samples_after_qc = samples_arr[ind_missing_filter].tolist()
         
         if gt_qc.shape[1] == 0:
             min_missing = 1.0 
@@ -115,15 +437,16 @@ def apply_quality_control(callset, maf_threshold=0.05, snp_missing_threshold=0.2
         
         snps_after_qc_count = gt_qc.shape[0]
         
-        gn = gt_qc.to_n_alt(fill=-1)
-        
-        non_missing_gn = gn[gn != -1]
-        if non_missing_gn.size == 0 or (non_missing_gn.size > 0 and non_missing_gn.std() == 0) :
+        gn = _to_n_alt_int8(gt_qc)
+        del gt_qc
+
+        if _dosages_constant(gn):
             raise ValueError("Tidak ada variasi genetik tersisa setelah QC (semua genotipe sama atau hilang).")
 
-        imputer = SimpleImputer(missing_values=-1, strategy="mean")
-        gn_imputed_transposed = imputer.fit_transform(gn.T) 
-        
+        gn_imputed_transposed = impute_genotypes_transposed(gn)
+        del gn
+        gc.collect()
+
         return gn_imputed_transposed, samples_after_qc, snps_original_count, snps_after_qc_count, samples_original_count
         
     except Exception as e:
@@ -133,6 +456,37 @@ def apply_quality_control(callset, maf_threshold=0.05, snp_missing_threshold=0.2
             raise ValueError(f"Kesalahan selama kontrol kualitas: {str(e)}")
 
 
+def _pca_via_cov_eigh(X_centered, n_components):
+    n_samples = X_centered.shape[0]
+    gram = (X_centered @ X_centered.T).astype(np.float64)
+
+    eigvals, eigvecs = eigh(gram, subset_by_index=[n_samples - n_components, n_samples - 1])
+    eigvals = np.maximum(eigvals[::-1], 0.0)
+    eigvecs = eigvecs[:, ::-1]
+
+    # konvensi tanda deterministik: elemen terbesar setiap eigenvector dibuat positif
+    max_abs_rows = np.argmax(np.abs(eigvecs), axis=0)
+    signs = np.sign(eigvecs[max_abs_rows, np.arange(eigvecs.shape[1])])
+    signs[signs == 0] = 1.0
+    eigvecs = eigvecs * signs
+
+    pcs = eigvecs * np.sqrt(eigvals)
+    total_var = np.trace(gram)
+    if total_var > 0:
+        explained_variance_ratio = eigvals / total_var
+    else:
+        explained_variance_ratio = np.zeros_like(eigvals)
+    return pcs, explained_variance_ratio
+
+
+def _pca_via_gpu(X_scaled, n_components):
+    X_gpu = cupy.asarray(X_scaled)
+    pca_model = cuml.PCA(n_components=n_components, svd_solver='jacobi')
+    pcs = cupy.asnumpy(pca_model.fit_transform(X_gpu))
+    explained_variance_ratio = np.asarray(cupy.asnumpy(pca_model.explained_variance_ratio_))
+    return pcs, explained_variance_ratio
+
+
 def run_pca_analysis(genotype_matrix_imputed, n_components=3):
     try:
         n_samples, n_features = genotype_matrix_imputed.shape
@@ -149,13 +503,53 @@ def run_pca_analysis(genotype_matrix_imputed, n_components=3):
              raise ValueError(f"Tidak dapat menjalankan PCA dengan {effective_n_components} komponen. Perlu setidaknya 1 komponen yang valid berdasarkan data.")
 
         print(f"Menjalankan PCA dengan {effective_n_components} komponen pada {n_samples} sampel dan {n_features} fitur")
-        
-        scaler = StandardScaler()
-        genotype_matrix_scaled = scaler.fit_transform(genotype_matrix_imputed)
-        
-        pca_model = PCA(n_components=effective_n_components, random_state=42)
-        pcs = pca_model.fit_transform(genotype_matrix_scaled)
-        explained_variance_ratio = pca_model.explained_variance_ratio_
+
+        genotype_matrix_scaled = np.ascontiguousarray(genotype_matrix_imputed, dtype=np.float32)
+        genotype_matrix_scaled = standardize_inplace(genotype_matrix_scaled)
+
+        pcs = None
+        explained_variance_ratio = None
+
+        if cuml is not None and min(n_samples, n_features) > 1000:
+            try:
+                pcs, explained_variance_ratio = _pca_via_gpu(genotype_matrix_scaled, effective_n_components)
+            except Exception as e_gpu:
+                print(f"Peringatan: PCA GPU gagal, kembali ke jalur CPU: {str(e_gpu)}")
+                pcs = None
+
+        if pcs is not None:
+            pass
+        elif n_features >= 4 * n_samples:
+            pcs, explained_variance_ratio = _pca_via_cov_eigh(genotype_matrix_scaled, effective_n_components)
+        elif min(n_samples, n_features) <= 500:
+            pca_model = PCA(n_components=effective_n_components, svd_solver='full',
+                            random_state=42, copy=False)
+            pcs = pca_model.fit_transform(genotype_matrix_scaled)
+            explained_variance_ratio = pca_model.explained_variance_ratio_
+        else:
+            if effective_n_components <= 3:
+                U, S, _Vt = svds(genotype_matrix_scaled, k=effective_n_components,
+                                 solver='arpack', tol=1e-4)
+                order = np.argsort(-S)
+                U = U[:, order]
+                S = S[order]
+                # konvensi tanda sama dengan _pca_via_cov_eigh
+                max_abs_rows = np.argmax(np.abs(U), axis=0)
+                signs = np.sign(U[max_abs_rows, np.arange(U.shape[1])])
+                signs[signs == 0] = 1.0
+                U = U * signs
+            else:
+                U, S, _Vt = randomized_svd(genotype_matrix_scaled,
+                                           n_components=effective_n_components,
+                                           n_oversamples=7, n_iter=4,
+                                           power_iteration_normalizer='LU',
+                                           random_state=42)
+            pcs = U * S
+            total_var = float(np.square(genotype_matrix_scaled).sum(dtype=np.float64))
+            if total_var > 0:
+                explained_variance_ratio = (S.astype(np.float64) ** 2) / total_var
+            else:
+                explained_variance_ratio = np.zeros_like(S)
         
         if pcs.shape[0] != n_samples:
             raise ValueError("Output PCA memiliki jumlah sampel yang salah.")